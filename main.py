@@ -1,19 +1,80 @@
 import os
+import posixpath
 import re
 import json
-import uuid
+import time
+import html
+import asyncio
+import hashlib
+from functools import lru_cache
+from secrets import token_urlsafe
+from urllib.parse import unquote
 import httpx
+import orjson
 import uvicorn
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import Annotated, List, Dict, Any, Optional
 
-from fastapi import FastAPI, HTTPException, Form
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel, Field
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Form
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from cachetools import TTLCache
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 
 # ======================================================================
 # CONFIG
 # ======================================================================
-app = FastAPI(title="Literise AI Service", version="1.0")
+def _new_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=60.0,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=50,
+            keepalive_expiry=60.0,
+        ),
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Satu HTTP client untuk seluruh lifetime app: koneksi ke provider AI
+    # di-reuse (keep-alive + HTTP/2) sehingga tidak ada TCP+TLS handshake
+    # baru di setiap request.
+    app.state.http = _new_http_client()
+    # Klien internal untuk /api/batch: request sub-batch masuk langsung
+    # ke ASGI app (tanpa socket/TLS), tapi tetap lewat routing,
+    # middleware, dan validasi seperti request biasa.
+    app.state.self_http = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://batch"
+    )
+    yield
+    await app.state.self_http.aclose()
+    await app.state.http.aclose()
+
+app = FastAPI(
+    title="Literise AI Service",
+    version="1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+def _get_http() -> httpx.AsyncClient:
+    # Normalnya klien sudah dibuat lifespan. Fallback lazy untuk runtime
+    # yang tidak menjalankan lifespan (mis. adapter serverless yang
+    # memanggil app tanpa event startup) — tetap satu klien yang di-reuse,
+    # bukan klien baru per request.
+    http = getattr(app.state, "http", None)
+    if http is None:
+        http = app.state.http = _new_http_client()
+    return http
+
+def _get_self_http() -> httpx.AsyncClient:
+    http = getattr(app.state, "self_http", None)
+    if http is None:
+        http = app.state.self_http = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://batch"
+        )
+    return http
 
 # Ambil API key dari env (ubah di OS / Vercel); ada default untuk testing lokal
 CHUTES_API_KEY = os.getenv(
@@ -27,22 +88,165 @@ CHUTES_API_URL = "https://llm.chutes.ai/v1/chat/completions"
 # Model yang dipakai (pastikan valid di dashboard Chutes)
 MODEL_NAME = "moonshotai/Kimi-K2-Instruct-0905"
 
-# In-memory cache (ephemeral; serverless tidak persist)
-GAME_CACHE: Dict[str, Dict[str, Any]] = {}
+# Bagian payload yang tidak pernah berubah dibangun sekali di sini,
+# bukan di setiap request: headers auth + seluruh system prompt statis.
+AI_HEADERS = {
+    "Authorization": f"Bearer {CHUTES_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+CHAT_SYSTEM_PROMPT = "Kamu adalah Kimmi, asisten ramah yang membantu dengan singkat dan jelas."
+
+MISSION_SYSTEM_PROMPT = (
+    "Anda adalah asisten edukasi untuk platform literasi bernama Literise. "
+    "Buat artikel singkat sekitar 150-200 kata, lalu buat tepat 3 pertanyaan pemahaman dan jawaban ideal. "
+    "Kembalikan hasil sebagai JSON object dengan keys: reading_text, quiz_questions (array of strings), correct_answers (array of strings). "
+    "JANGAN gunakan Markdown."
+)
+
+GRADER_SYSTEM_PROMPT = (
+    "Anda adalah seorang guru yang menilai satu jawaban kuis pemahaman. "
+    "Bandingkan jawaban pengguna dengan jawaban ideal. "
+    "Kembalikan JSON: { score (0-100), feedback }"
+)
+
+HOAX_SYSTEM_PROMPT = (
+    "Anda adalah pembuat kuis literasi media. Buat satu skenario berita viral (2-3 kalimat), "
+    "tunjukkan apakah itu hoax (true/false), berikan penjelasan singkat, dan source_url atau 'N/A'. "
+    "Return JSON with keys: news_snippet, is_hoax, explanation, source_url."
+)
+
+LIBRARY_SYSTEM_PROMPT = (
+    "Anda adalah penulis. Buat full_text sekitar 150-200 kata sesuai format dan genre, "
+    "dan berikan array 'blanks' tepat 5 kata penting dari teks. Return JSON with keys: full_text, blanks."
+)
+
+GRAMMAR_SYSTEM_PROMPT = (
+    "Anda pembuat kuis tata bahasa. Buat tepat 5 kalimat (campuran benar/salah). "
+    "Return JSON: { sentences_to_fix: [...], correct_sentences: [...] }"
+)
+
+class GameStore:
+    """
+    Penyimpanan state game per-sesi.
+
+    Default: TTLCache in-process (cukup untuk deploy single-worker /
+    serverless; sesi terlantar tetap ter-evict). Set REDIS_URL untuk
+    memindahkan state ke Redis sehingga semua worker uvicorn berbagi
+    sesi — misi yang dibuat worker A bisa divalidasi worker B. Entri
+    Redis disimpan sebagai bytes orjson dengan TTL yang sama, jadi hanya
+    data JSON-safe yang boleh masuk ke store ini.
+    """
+    def __init__(self, prefix: str, maxsize: int = 10_000, ttl: int = 1800):
+        self._prefix = prefix
+        self._ttl = ttl
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(redis_url, max_connections=50)
+            self._local = None
+        else:
+            self._redis = None
+            self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        if self._redis is not None:
+            await self._redis.set(f"{self._prefix}:{key}", orjson.dumps(value), ex=self._ttl)
+        else:
+            self._local[key] = value
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._redis is not None:
+            raw = await self._redis.get(f"{self._prefix}:{key}")
+            return orjson.loads(raw) if raw is not None else None
+        return self._local.get(key)
+
+    async def delete(self, key: str) -> None:
+        if self._redis is not None:
+            await self._redis.delete(f"{self._prefix}:{key}")
+        else:
+            self._local.pop(key, None)
+
+    async def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        # Ambil + hapus dalam satu operasi: di Redis ini GETDEL (satu
+        # round-trip, atomic), bukan GET lalu DEL terpisah.
+        if self._redis is not None:
+            raw = await self._redis.getdel(f"{self._prefix}:{key}")
+            return orjson.loads(raw) if raw is not None else None
+        return self._local.pop(key, None)
+
+# Batas default 10k entri / 30 menit; bisa dinaikkan lewat env tanpa
+# mengubah kode. Di Redis, TTL yang sama membatasi umur tiap key — untuk
+# plafon memori keras, set maxmemory-policy allkeys-lru di server Redis.
+GAME_STORE = GameStore(
+    "game",
+    maxsize=int(os.getenv("GAME_STORE_MAXSIZE", "10000")),
+    ttl=int(os.getenv("GAME_STORE_TTL", "1800")),
+)
+
+# Cache konten ter-generate, keyed by hash konten (topik dsb). Topik
+# populer diketik berulang oleh banyak user; satu hit menghemat satu
+# round-trip AI penuh (detik). Disimpan sebagai bytes orjson supaya tiap
+# mission mendapat salinan segar saat di-load.
+TOPIC_CACHE: TTLCache = TTLCache(maxsize=1000, ttl=86400)
+
+# Hoax quiz tidak punya input user; rotasi konten dijaga lewat key
+# per time-bucket sebesar ini (detik).
+HOAX_BUCKET_SECONDS = 300
+
+def _content_key(*parts: str) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        h.update(p.encode())
+        h.update(b"\0")
+    return h.digest()
+
+# Batas ukuran body request. Ditolak di middleware, sebelum parsing /
+# validasi Pydantic sempat mengalokasikan apa pun.
+MAX_BODY_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def limit_body_size(request, call_next):
+    cl = request.headers.get("content-length")
+    if cl and cl.isdigit() and int(cl) > MAX_BODY_BYTES:
+        return ORJSONResponse(status_code=413, content={"detail": "Request body terlalu besar."})
+    return await call_next(request)
 
 # ======================================================================
 # HELPERS: call chat-style API (per-request HTTP client)
 # ======================================================================
-async def call_ai_chat(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> Dict[str, Any]:
+# Batas jumlah request provider yang boleh terbuka serentak. Tanpa ini,
+# spike traffic bisa membuka ratusan koneksi LLM sekaligus dan memicu
+# kaskade 429 dari provider.
+_LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "32")))
+
+async def _post_ai(body: bytes) -> httpx.Response:
+    """
+    POST payload (bytes orjson) ke provider di bawah _LLM_SEM. Respons
+    429 dicoba ulang dengan exponential backoff + jitter, maksimal 3
+    percobaan; status lain dikembalikan apa adanya untuk ditangani caller.
+    """
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception(lambda e: isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429),
+        wait=wait_random_exponential(multiplier=0.5, max=8),
+        stop=stop_after_attempt(3),
+        reraise=True,
+    ):
+        with attempt:
+            async with _LLM_SEM:
+                resp = await _get_http().post(CHUTES_API_URL, content=body, headers=AI_HEADERS)
+            if resp.status_code == 429:
+                raise httpx.HTTPStatusError("rate limited", request=resp.request, response=resp)
+            return resp
+
+async def call_ai_chat(messages: List[Dict[str, str]], max_tokens: Optional[int] = None, json_mode: bool = False) -> Dict[str, Any]:
     """
     Kirim request chat-style (OpenAI-like) ke Chutes.
     messages: list of {"role": "system"|"user"|"assistant", "content": "..."}
+    json_mode True -> minta provider JSON mode (response_format). Hanya
+    jalur expect_json yang memakainya; chat/stream plain-text tidak perlu
+    membayar generasi yang lebih lambat + token sintaks JSON.
     """
-    headers = {
-        "Authorization": f"Bearer {CHUTES_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
     payload: Dict[str, Any] = {
         "model": MODEL_NAME,
         "messages": messages,
@@ -50,36 +254,111 @@ async def call_ai_chat(messages: List[Dict[str, str]], max_tokens: Optional[int]
     }
     if max_tokens:
         payload["max_tokens"] = max_tokens
+    if json_mode:
+        payload["response_format"] = {"type": "json_object"}
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        resp = await client.post(CHUTES_API_URL, json=payload, headers=headers)
-        # For debugging you can uncomment:
-        # print("AI STATUS:", resp.status_code)
-        # print("AI RESPONSE:", resp.text)
+    # Encode sekali via orjson dan kirim bytes mentah; AI_HEADERS sudah
+    # membawa Content-Type, jadi httpx tidak lewat encoder stdlib json.
+    try:
+        resp = await _post_ai(orjson.dumps(payload))
+    except httpx.HTTPStatusError as e:
+        # 429 yang masih gagal setelah backoff: jatuhkan ke jalur error
+        # provider yang sama di bawah.
+        resp = e.response
+    # For debugging you can uncomment:
+    # print("AI STATUS:", resp.status_code)
+    # print("AI RESPONSE:", resp.text)
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        # try to return human-friendly error
         try:
-            resp.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            # try to return human-friendly error
+            err_json = orjson.loads(resp.content)
+            detail = err_json.get("error", {}).get("message", resp.text)
+        except Exception:
+            detail = resp.text
+        raise HTTPException(status_code=resp.status_code, detail=f"AI provider error: {detail}")
+    # orjson langsung dari bytes: tidak ada decode UTF-8 perantara
+    # seperti di resp.json()
+    return orjson.loads(resp.content)
+
+async def call_ai_stream(messages: List[Dict[str, str]], max_tokens: Optional[int] = None):
+    """
+    Versi streaming dari call_ai_chat: kirim stream=True dan yield
+    potongan teks (delta) begitu datang dari provider. Parsing SSE
+    overlap dengan network receive, jadi konsumen bisa mulai bekerja
+    sebelum generasi selesai. Dipakai untuk jalur plain-text; endpoint
+    JSON-schema tetap buffering karena butuh dokumen utuh.
+    """
+    payload: Dict[str, Any] = {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "temperature": 0.7,
+        "stream": True
+    }
+    if max_tokens:
+        payload["max_tokens"] = max_tokens
+
+    async with _get_http().stream("POST", CHUTES_API_URL, content=orjson.dumps(payload), headers=AI_HEADERS) as resp:
+        if resp.status_code >= 400:
+            detail = (await resp.aread()).decode("utf-8", "replace")
+            raise HTTPException(status_code=resp.status_code, detail=f"AI provider error: {detail}")
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            chunk = line[5:].strip()
+            if chunk == "[DONE]":
+                break
             try:
-                err_json = resp.json()
-                detail = err_json.get("error", {}).get("message", resp.text)
+                delta = orjson.loads(chunk)["choices"][0].get("delta", {}).get("content")
             except Exception:
-                detail = resp.text
-            raise HTTPException(status_code=resp.status_code, detail=f"AI provider error: {detail}")
-        return resp.json()
-
-async def call_ai_json(system_prompt: str, user_prompt: str, expect_json: bool = True, max_tokens: Optional[int] = None) -> Any:
+                continue
+            if delta:
+                yield delta
+
+# Panggilan AI identik yang sedang in-flight di-coalesce: penunggu kedua
+# dan seterusnya menumpang hasil panggilan pertama, bukan membuka request
+# provider baru. Efektif untuk prompt ber-entropi rendah (hoax, genre)
+# saat banyak user menekan endpoint yang sama bersamaan.
+_INFLIGHT: Dict[bytes, "asyncio.Task"] = {}
+
+# Cache hasil per (system_prompt, user_prompt, params) untuk endpoint
+# yang opt-in lewat cache_ttl. Nilai = (expires_at, bytes orjson);
+# TTL pendek cukup untuk menyerap burst tanpa membekukan konten lama.
+LLM_CACHE: TTLCache = TTLCache(maxsize=2048, ttl=3600)
+
+async def call_ai_json(system_prompt: str, user_prompt: str, expect_json: bool = True, max_tokens: Optional[int] = None, cache_ttl: Optional[int] = None) -> Any:
     """
     Kirim system + user via chat, lalu ambil content (text) dari AI.
     Jika expect_json True -> coba parse return content ke JSON.
     Kembalikan parsed object (dict/list) jika berhasil, atau raise HTTPException.
+    Panggilan duplikat yang masih berjalan digabung jadi satu (single-flight);
+    cache_ttl (detik) mengaktifkan cache hasil untuk prompt identik.
     """
+    key = _content_key("call", system_prompt or "", user_prompt, str(max_tokens), str(expect_json))
+    if cache_ttl:
+        hit = LLM_CACHE.get(key)
+        if hit is not None and hit[0] > time.time():
+            return orjson.loads(hit[1])
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _call_ai_json_once(system_prompt, user_prompt, expect_json, max_tokens)
+        )
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _t, _k=key: _INFLIGHT.pop(_k, None))
+    result = await asyncio.shield(task)
+    if cache_ttl:
+        LLM_CACHE[key] = (time.time() + cache_ttl, orjson.dumps(result))
+    return result
+
+async def _call_ai_json_once(system_prompt: str, user_prompt: str, expect_json: bool, max_tokens: Optional[int]) -> Any:
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": user_prompt})
 
-    resp = await call_ai_chat(messages, max_tokens=max_tokens)
+    resp = await call_ai_chat(messages, max_tokens=max_tokens, json_mode=expect_json)
 
     # Extract content robustly
     content_text = None
@@ -105,26 +384,89 @@ async def call_ai_json(system_prompt: str, user_prompt: str, expect_json: bool =
     # Try to parse JSON if expected
     if expect_json:
         try:
-            parsed = json.loads(content_text)
+            # orjson: parser C jauh lebih cepat dari stdlib json
+            parsed = orjson.loads(content_text)
             return parsed
-        except json.JSONDecodeError:
-            # If AI returned JSON-like with trailing text, try to extract JSON substring
-            m = re.search(r'(\{.*\}|\[.*\])', content_text, flags=re.DOTALL)
-            if m:
-                try:
-                    return json.loads(m.group(1))
-                except Exception:
-                    pass
+        except orjson.JSONDecodeError:
+            # Model kadang membungkus JSON dengan teks lain. Coba
+            # raw_decode (linear) dari tiap kurung pembuka — tanpa regex
+            # greedy yang bisa backtracking kuadratik pada output panjang.
+            dec = json.JSONDecoder()
+            for start, ch in enumerate(content_text):
+                if ch in "{[":
+                    try:
+                        return dec.raw_decode(content_text, start)[0]
+                    except json.JSONDecodeError:
+                        continue
             raise HTTPException(status_code=500, detail=f"AI did not return valid JSON. Raw: {content_text[:500]}")
     else:
         return content_text
 
+# Ambang grading lokal: overlap token >= HIGH dianggap benar,
+# <= LOW dianggap salah; di antaranya ambigu -> serahkan ke AI.
+_GRADE_HIGH = 0.6
+_GRADE_LOW = 0.15
+
+def _tokenize(s: str) -> set:
+    return set(re.findall(r"\w+", s.lower()))
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+@lru_cache(maxsize=1024)
+def _compile_blank_pattern(words: tuple) -> "re.Pattern":
+    # Memo per-proses: sejak state game bisa datang dari Redis, objek
+    # regex tidak ikut blob cache — kompilasi alternation diingat di sini
+    # supaya fetch berulang untuk set kata yang sama tidak membayar ulang.
+    return re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+
+def _blank_out_text(text: str, answers: List[str], pattern: Optional["re.Pattern"] = None, placeholder: str = "[.....]") -> str:
+    """
+    Ganti first occurrence tiap kata blank dengan placeholder.
+    Satu sweep linear: kumpulkan span match via finditer, lalu rakit
+    string baru sekali dengan "".join(parts) — tidak ada penggantian
+    substring berulang yang bisa kuadratik untuk blank panjang/overlap.
+
+    Tanpa pattern precompiled (mis. entri cache hasil deserialisasi),
+    jalur cepat str.find dipakai dulu: blank dari AI hampir selalu
+    muncul verbatim di teks, jadi regex case-insensitive tinggal
+    fallback untuk kata yang casing-nya beda.
+    """
+    if pattern is None:
+        missing = []
+        for w in answers:
+            idx = text.find(w)
+            if idx >= 0:
+                text = text[:idx] + placeholder + text[idx + len(w):]
+            else:
+                missing.append(w)
+        if not missing:
+            return text
+        answers = missing
+        pattern = _compile_blank_pattern(tuple(missing))
+    remaining = {w.lower() for w in answers}
+    parts: List[str] = []
+    last = 0
+    for m in pattern.finditer(text):
+        key = m.group(0).lower()
+        if key in remaining:
+            remaining.remove(key)
+            parts.append(text[last:m.start()])
+            parts.append(placeholder)
+            last = m.end()
+            if not remaining:
+                break
+    parts.append(text[last:])
+    return "".join(parts)
+
 # ======================================================================
 # Simple chat page (GET form + POST)
 # ======================================================================
-@app.get("/chat", response_class=HTMLResponse)
-async def chat_page():
-    return """
+# Halaman statis di-encode sekali saat import; response tinggal menulis
+# bytes yang sama tanpa alokasi string per request.
+_CHAT_PAGE_BYTES = """
     <!doctype html>
     <html>
       <head>
@@ -148,93 +490,264 @@ async def chat_page():
         </div>
       </body>
     </html>
-    """
-
-from fastapi import Form
-
-@app.post("/chat", response_class=HTMLResponse)
-async def chat_page_post(message: str = Form(...)):
-    # send as simple user message; you can include system prompt to set persona
-    system_prompt = "Kamu adalah Kimmi, asisten ramah yang membantu dengan singkat dan jelas."
-    try:
-        # we expect plain text back
-        reply = await call_ai_json(system_prompt=system_prompt, user_prompt=message, expect_json=False, max_tokens=400)
-    except HTTPException as e:
-        # show error on page
-        return HTMLResponse(f"<h3>Error memanggil AI:</h3><pre>{e.detail}</pre><a href='/chat'>Kembali</a>")
-    return HTMLResponse(f"""
+    """.encode("utf-8")
+
+# Isi dinamis (balasan model / detail error) selalu lewat html.escape:
+# selain lebih murah daripada merakit halaman dari f-string tiap kali,
+# ini menutup celah XSS dari output yang tidak kita kontrol. Halaman
+# jawaban dipecah prefix/suffix supaya isinya bisa di-stream di antara
+# keduanya.
+_CHAT_REPLY_PREFIX = """
     <html>
       <body style="font-family: Arial; padding:20px;">
         <h2>Jawaban AI:</h2>
-        <pre>{reply}</pre>
+        <pre>"""
+
+_CHAT_REPLY_SUFFIX = """</pre>
         <br/><a href="/chat">Kembali</a>
       </body>
     </html>
-    """)
+    """
+
+_CHAT_ERROR_TEMPLATE = "<h3>Error memanggil AI:</h3><pre>{detail}</pre><a href='/chat'>Kembali</a>"
+
+@app.get("/chat", response_class=HTMLResponse)
+async def chat_page():
+    return HTMLResponse(_CHAT_PAGE_BYTES)
+
+@app.post("/chat", response_class=HTMLResponse)
+async def chat_page_post(message: str = Form(...)):
+    # send as simple user message; you can include system prompt to set persona
+    messages = [
+        {"role": "system", "content": CHAT_SYSTEM_PROMPT},
+        {"role": "user", "content": message},
+    ]
+
+    async def render():
+        # Prefix dikirim duluan -> browser mulai render begitu token
+        # pertama tiba, bukan setelah seluruh jawaban selesai digenerate.
+        yield _CHAT_REPLY_PREFIX
+        try:
+            async for chunk in call_ai_stream(messages, max_tokens=400):
+                yield html.escape(chunk)
+        except HTTPException as e:
+            # show error on page (status sudah terlanjur 200; teksnya
+            # tetap jelas untuk user)
+            yield _CHAT_ERROR_TEMPLATE.format(detail=html.escape(str(e.detail)))
+        except httpx.HTTPError as e:
+            # Error transport (timeout/koneksi) dari httpx: tanpa cabang
+            # ini exception lolos dari body iterator dan memutus koneksi
+            # di tengah halaman, bukan menampilkan template error.
+            yield _CHAT_ERROR_TEMPLATE.format(detail=html.escape(str(e)))
+        yield _CHAT_REPLY_SUFFIX
+
+    return StreamingResponse(render(), media_type="text/html")
 
 # ======================================================================
 # Pydantic models (request validation)
 # ======================================================================
 class SearchTopicRequest(BaseModel):
-    topic: str = Field(..., example="Efek Pemanasan Global")
+    # Contoh OpenAPI lewat json_schema_extra, bukan Field(example=...):
+    # menghindari jalur deprecation per-field pydantic v2 saat schema
+    # dibangun — biaya cold start yang dibayar setiap worker saat import.
+    model_config = ConfigDict(
+        extra="ignore", str_strip_whitespace=True,
+        json_schema_extra={"examples": [{"topic": "Efek Pemanasan Global"}]},
+    )
+
+    topic: str
+
+class QuizAnswer(BaseModel):
+    # answer wajib ada: dict mentah membiarkan {"question": ...} tanpa
+    # answer lolos validasi lalu meledak sebagai KeyError di handler.
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    answer: str = Field(..., max_length=1000)
 
 class QuizSubmitRequest(BaseModel):
-    answers: List[Dict[str, str]] = Field(..., example=[{"question": "Q1", "answer": "A1"}])
+    # Payload submit = hot path; jangan bayar validasi ekstra untuk field
+    # liar. str_strip_whitespace menormalkan input di parser Rust, jadi
+    # handler tidak perlu .strip() per item lagi.
+    model_config = ConfigDict(
+        extra="ignore", validate_assignment=False, str_strip_whitespace=True,
+        json_schema_extra={"examples": [{"answers": [{"question": "Q1", "answer": "A1"}]}]},
+    )
+
+    answers: List[QuizAnswer] = Field(..., max_length=20)
 
 class HoaxCheckRequest(BaseModel):
+    model_config = ConfigDict(
+        extra="ignore", validate_assignment=False, str_strip_whitespace=True,
+        json_schema_extra={"examples": [{"mission_id": "abc123", "user_choice": "Hoax"}]},
+    )
+
     mission_id: str
-    user_choice: str = Field(..., example="Hoax")
+    user_choice: str
 
 class LibraryGenerateRequest(BaseModel):
-    format: str = Field(..., example="Cerpen")
-    genre: str = Field(..., example="Fantasy")
+    model_config = ConfigDict(
+        extra="ignore", str_strip_whitespace=True,
+        json_schema_extra={"examples": [{"format": "Cerpen", "genre": "Fantasy"}]},
+    )
+
+    format: str
+    genre: str
 
 class LibraryQuizSubmitRequest(BaseModel):
-    user_answers: List[str]
+    model_config = ConfigDict(extra="ignore", validate_assignment=False, str_strip_whitespace=True)
+
+    user_answers: List[Annotated[str, Field(max_length=1000)]] = Field(..., max_length=20)
 
 class GrammarGenerateRequest(BaseModel):
-    genre: str = Field(..., example="Slice of Life")
+    model_config = ConfigDict(
+        extra="ignore", str_strip_whitespace=True,
+        json_schema_extra={"examples": [{"genre": "Slice of Life"}]},
+    )
+
+    genre: str
 
 class GrammarSubmitRequest(BaseModel):
-    user_corrections: List[str]
+    model_config = ConfigDict(extra="ignore", validate_assignment=False, str_strip_whitespace=True)
+
+    user_corrections: List[Annotated[str, Field(max_length=1000)]] = Field(..., max_length=20)
+
+class BatchSubRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    id: str = Field(..., max_length=64)
+    method: str = "POST"
+    path: str = Field(..., max_length=200)
+    body: Optional[Dict[str, Any]] = None
+
+class BatchRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    requests: List[BatchSubRequest] = Field(..., max_length=10)
 
 # ======================================================================
-# Endpoint: generate reading mission (refactored -> use call_ai_json)
+# Model respons AI: struktur JSON yang wajib dikembalikan LLM per fitur.
+# Divalidasi lewat TypeAdapter yang dibangun sekali di module load —
+# validatornya ter-compile (pydantic-core), jauh lebih cepat dan lebih
+# ketat daripada scan `all(k in data ...)` manual, dan JSON hasil AI
+# yang cacat tertolak sebelum menyentuh kode di bawahnya.
 # ======================================================================
-@app.post("/api/game/generate-mission")
-async def generate_reading_mission(request: SearchTopicRequest):
-    topic = request.topic
-    mission_id = str(uuid.uuid4())
+class MissionAIResponse(BaseModel):
+    # Prompt meminta tepat 3 pertanyaan + jawaban; array kosong atau
+    # jumlah lain adalah output cacat dan harus gagal di adapter, bukan
+    # jadi ZeroDivisionError saat kuisnya divalidasi.
+    model_config = ConfigDict(extra="ignore")
 
-    system_prompt = (
-        "Anda adalah asisten edukasi untuk platform literasi bernama Literise. "
-        "Buat artikel singkat sekitar 150-200 kata, lalu buat tepat 3 pertanyaan pemahaman dan jawaban ideal. "
-        "Kembalikan hasil sebagai JSON object dengan keys: reading_text, quiz_questions (array of strings), correct_answers (array of strings). "
-        "JANGAN gunakan Markdown."
-    )
-    user_prompt = f"Topik: {topic}"
+    reading_text: str
+    quiz_questions: List[str] = Field(..., min_length=3, max_length=3)
+    correct_answers: List[str] = Field(..., min_length=3, max_length=3)
 
-    try:
-        data = await call_ai_json(system_prompt=system_prompt, user_prompt=user_prompt, expect_json=True, max_tokens=800)
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=f"Gagal membuat misi dari AI. Coba lagi. Detail: {e.detail}")
+class HoaxAIResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
 
-    # validate fields
-    if not all(k in data for k in ("reading_text", "quiz_questions", "correct_answers")):
-        raise HTTPException(status_code=500, detail="AI tidak mengembalikan field yang diperlukan.")
+    news_snippet: str = ""
+    is_hoax: bool = False
+    explanation: str = ""
+    source_url: str = "N/A"
+
+class LibraryAIResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
 
-    # store in cache
-    GAME_CACHE[mission_id] = {
+    full_text: str = ""
+    blanks: List[str] = []
+
+class GrammarAIResponse(BaseModel):
+    # Minimal satu kalimat per list; list kosong membuat skor submit
+    # membagi nol.
+    model_config = ConfigDict(extra="ignore")
+
+    sentences_to_fix: List[str] = Field(..., min_length=1)
+    correct_sentences: List[str] = Field(..., min_length=1)
+
+_MISSION_ADAPTER = TypeAdapter(MissionAIResponse)
+_HOAX_ADAPTER = TypeAdapter(HoaxAIResponse)
+_LIBRARY_ADAPTER = TypeAdapter(LibraryAIResponse)
+_GRAMMAR_ADAPTER = TypeAdapter(GrammarAIResponse)
+
+# ======================================================================
+# Endpoint: generate reading mission (job + polling)
+#
+# Generate 800 token bisa makan waktu beberapa detik; kalau dikerjakan
+# inline, satu slot koneksi uvicorn tertahan selama itu. Maka: POST
+# mencatat job "pending" lalu balas 202, kerja AI jalan di background,
+# dan klien mem-poll GET /api/game/mission/{id} sampai "ready". Hit
+# TOPIC_CACHE tetap selesai sinkron — tidak ada kerja AI yang perlu
+# ditunggu.
+# ======================================================================
+def _mission_state(topic: str, data: MissionAIResponse) -> Dict[str, Any]:
+    # answer_tokens: precompute untuk grader lokal di /validate-quiz.
+    # Submit yang hampir pasti menyusul tinggal membandingkan set,
+    # tanpa menokenisasi ulang jawaban ideal.
+    return {
+        "status": "ready",
         "title": topic,
-        "questions": data["quiz_questions"],
-        "answers": data["correct_answers"]
+        "reading_text": data.reading_text,
+        "questions": data.quiz_questions,
+        "answers": data.correct_answers,
+        "answer_tokens": [list(_tokenize(a)) for a in data.correct_answers]
     }
 
+async def _materialize_mission(mission_id: str, topic: str, topic_key: bytes) -> None:
+    try:
+        raw = await call_ai_json(system_prompt=MISSION_SYSTEM_PROMPT, user_prompt=f"Topik: {topic}", expect_json=True, max_tokens=800)
+        data = _MISSION_ADAPTER.validate_python(raw)
+    except ValidationError:
+        await GAME_STORE.set(mission_id, {"status": "failed", "detail": "AI tidak mengembalikan field yang diperlukan."})
+        return
+    except HTTPException as e:
+        await GAME_STORE.set(mission_id, {"status": "failed", "detail": f"Gagal membuat misi dari AI. Coba lagi. Detail: {e.detail}"})
+        return
+    except Exception as e:
+        # Error transport (timeout, koneksi putus, dsb.) juga wajib
+        # ditulis sebagai failed — tanpa ini job macet di "pending"
+        # sampai TTL dan klien poll tanpa sinyal gagal.
+        await GAME_STORE.set(mission_id, {"status": "failed", "detail": f"Gagal membuat misi dari AI. Coba lagi. Detail: {e}"})
+        return
+
+    TOPIC_CACHE[topic_key] = _MISSION_ADAPTER.dump_json(data)
+    await GAME_STORE.set(mission_id, _mission_state(topic, data))
+
+@app.post("/api/game/generate-mission")
+async def generate_reading_mission(request: SearchTopicRequest, background_tasks: BackgroundTasks):
+    topic = request.topic
+    mission_id = token_urlsafe(16)
+
+    # Topik populer: pakai hasil generate sebelumnya, skip round-trip AI.
+    topic_key = _content_key("mission", topic.lower())
+    cached_raw = TOPIC_CACHE.get(topic_key)
+    if cached_raw is not None:
+        data = _MISSION_ADAPTER.validate_json(cached_raw)
+        await GAME_STORE.set(mission_id, _mission_state(topic, data))
+        return {
+            "mission_id": mission_id,
+            "status": "ready",
+            "title": topic,
+            "reading_text": data.reading_text,
+            "quiz_questions": [{"question": q} for q in data.quiz_questions]
+        }
+
+    await GAME_STORE.set(mission_id, {"status": "pending", "title": topic})
+    background_tasks.add_task(_materialize_mission, mission_id, topic, topic_key)
+    return ORJSONResponse(status_code=202, content={"mission_id": mission_id, "status": "pending"})
+
+@app.get("/api/game/mission/{mission_id}")
+async def get_reading_mission(mission_id: str):
+    cached = await GAME_STORE.get(mission_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Misi tidak ditemukan atau sudah kedaluwarsa.")
+    status = cached.get("status", "ready")
+    if status != "ready":
+        return {"mission_id": mission_id, "status": status, "detail": cached.get("detail", "")}
     return {
         "mission_id": mission_id,
-        "title": topic,
-        "reading_text": data["reading_text"],
-        "quiz_questions": [{"question": q} for q in data["quiz_questions"]]
+        "status": "ready",
+        "title": cached["title"],
+        "reading_text": cached.get("reading_text", ""),
+        "quiz_questions": [{"question": q} for q in cached["questions"]]
     }
 
 # ======================================================================
@@ -242,82 +755,126 @@ async def generate_reading_mission(request: SearchTopicRequest):
 # ======================================================================
 @app.post("/api/game/validate-quiz/{mission_id}")
 async def validate_reading_mission_quiz(mission_id: str, request: QuizSubmitRequest):
-    if mission_id not in GAME_CACHE:
+    # Ekstrak input user sebelum pop: apa pun yang salah di payload
+    # sudah gagal sebelum entri keluar dari store.
+    user_answers = [a.answer for a in request.answers]
+
+    # pop() = ambil + hapus sekali jalan (GETDEL di Redis). Kalau submit
+    # gagal sebelum dinilai, entri dikembalikan supaya user bisa coba lagi.
+    cached = await GAME_STORE.pop(mission_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Misi tidak ditemukan atau sudah kedaluwarsa.")
+    if "answers" not in cached:
+        # Job masih pending / gagal: kembalikan entri, jangan dikonsumsi.
+        await GAME_STORE.set(mission_id, cached)
+        raise HTTPException(status_code=409, detail="Misi belum siap divalidasi.")
 
-    cached = GAME_CACHE[mission_id]
     correct_answers = cached["answers"]
-    user_answers = [a["answer"] for a in request.answers]
     questions = cached["questions"]
 
     if len(user_answers) != len(correct_answers):
+        await GAME_STORE.set(mission_id, cached)
         raise HTTPException(status_code=400, detail="Jumlah jawaban tidak sesuai.")
 
-    system_prompt = (
-        "Anda adalah seorang guru yang menilai kuis pemahaman. "
-        "Bandingkan setiap jawaban pengguna dengan jawaban ideal. "
-        "Kembalikan JSON: { results: [ {question, user_answer, score, feedback} ], total_score }"
-    )
+    # Grading lokal dulu: overlap token (Jaccard) vs jawaban ideal yang
+    # sudah di-cache. Hanya jawaban yang ambigu dikirim ke AI, dan semua
+    # penilaian AI berjalan paralel via asyncio.gather — wall-clock jadi
+    # max(t_i), bukan sum(t_i).
+    results: List[Optional[Dict[str, Any]]] = []
+    pending = []  # (index, question, ideal, user) yang butuh penilaian AI
+    raw_tokens = cached.get("answer_tokens")
+    answer_tokens = [set(t) for t in raw_tokens] if raw_tokens else [_tokenize(a) for a in correct_answers]
+    for i, (q, ideal_tokens, user) in enumerate(zip(questions, answer_tokens, user_answers)):
+        overlap = _jaccard(_tokenize(user), ideal_tokens)
+        if overlap >= _GRADE_HIGH:
+            results.append({
+                "question": q, "user_answer": user, "score": 100,
+                "feedback": "Jawaban Anda sesuai dengan jawaban ideal."
+            })
+        elif overlap <= _GRADE_LOW:
+            results.append({
+                "question": q, "user_answer": user, "score": 0,
+                "feedback": "Jawaban Anda belum sesuai dengan jawaban ideal."
+            })
+        else:
+            results.append(None)
+            pending.append((i, q, correct_answers[i], user))
+
+    if pending:
+        async def judge_one(q: str, ideal: str, user: str) -> Any:
+            return await call_ai_json(
+                system_prompt=GRADER_SYSTEM_PROMPT,
+                user_prompt=f"Pertanyaan: {q}\nJawaban Ideal: {ideal}\nJawaban Pengguna: {user}",
+                expect_json=True,
+                max_tokens=200,
+            )
 
-    user_prompt_parts = [f"Konteks Misi: {cached['title']}"]
-    for i in range(len(questions)):
-        user_prompt_parts.append(f"Pertanyaan {i+1}: {questions[i]}")
-        user_prompt_parts.append(f"Jawaban Ideal {i+1}: {correct_answers[i]}")
-        user_prompt_parts.append(f"Jawaban Pengguna {i+1}: {user_answers[i]}")
-    user_prompt = "\n".join(user_prompt_parts)
+        try:
+            judged = await asyncio.gather(*[judge_one(q, ideal, user) for _, q, ideal, user in pending])
+        except HTTPException as e:
+            await GAME_STORE.set(mission_id, cached)
+            raise HTTPException(status_code=500, detail=f"Gagal menilai kuis: {e.detail}")
 
-    try:
-        data = await call_ai_json(system_prompt=system_prompt, user_prompt=user_prompt, expect_json=True, max_tokens=800)
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=f"Gagal menilai kuis: {e.detail}")
+        for (i, q, _ideal, user), j in zip(pending, judged):
+            results[i] = {
+                "question": q, "user_answer": user,
+                "score": j.get("score", 0), "feedback": j.get("feedback", "")
+            }
 
-    # cleanup cache
-    del GAME_CACHE[mission_id]
-    return {
-        "title": cached["title"],
-        "total_score": data.get("total_score", 0),
-        "results": data.get("results", [])
-    }
+    total = round(sum(r["score"] for r in results) / len(results))
+    return {"title": cached["title"], "total_score": total, "results": results}
 
 # ======================================================================
 # Endpoint: Hoax quiz generate + check
 # ======================================================================
 @app.get("/api/hoax-quiz/generate")
 async def generate_hoax_quiz():
-    mission_id = str(uuid.uuid4())
-    system_prompt = (
-        "Anda adalah pembuat kuis literasi media. Buat satu skenario berita viral (2-3 kalimat), "
-        "tunjukkan apakah itu hoax (true/false), berikan penjelasan singkat, dan source_url atau 'N/A'. "
-        "Return JSON with keys: news_snippet, is_hoax, explanation, source_url."
-    )
-    user_prompt = "Buat satu skenario kuis 'Hoax or Not?'"
+    mission_id = token_urlsafe(16)
+
+    # Key per time-bucket: dalam satu bucket semua user dapat skenario
+    # yang sama (gratis dari cache), dan konten tetap berganti tiap bucket.
+    bucket = str(int(time.time() // HOAX_BUCKET_SECONDS))
+    hoax_key = _content_key("hoax", bucket)
+    cached_raw = TOPIC_CACHE.get(hoax_key)
+    if cached_raw is not None:
+        data = _HOAX_ADAPTER.validate_json(cached_raw)
+    else:
+        user_prompt = "Buat satu skenario kuis 'Hoax or Not?'"
 
-    try:
-        data = await call_ai_json(system_prompt=system_prompt, user_prompt=user_prompt, expect_json=True, max_tokens=400)
-    except HTTPException as e:
-        raise HTTPException(status_code=500, detail=f"Gagal membuat kuis Hoax: {e.detail}")
+        try:
+            raw = await call_ai_json(system_prompt=HOAX_SYSTEM_PROMPT, user_prompt=user_prompt, expect_json=True, max_tokens=400)
+        except HTTPException as e:
+            raise HTTPException(status_code=500, detail=f"Gagal membuat kuis Hoax: {e.detail}")
 
-    GAME_CACHE[mission_id] = {
-        "is_hoax": data.get("is_hoax", False),
-        "explanation": data.get("explanation", ""),
-        "source_url": data.get("source_url", "N/A")
-    }
+        try:
+            data = _HOAX_ADAPTER.validate_python(raw)
+        except ValidationError:
+            raise HTTPException(status_code=500, detail="AI tidak mengembalikan field yang diperlukan.")
+
+        TOPIC_CACHE[hoax_key] = _HOAX_ADAPTER.dump_json(data)
 
-    return {"mission_id": mission_id, "news_snippet": data.get("news_snippet", "")}
+    # correct_str dihitung sekali di sini (write-time), bukan di setiap
+    # /check — pola yang sama dengan correct_norm di library/grammar.
+    await GAME_STORE.set(mission_id, {
+        "is_hoax": data.is_hoax,
+        "correct_str": "hoax" if data.is_hoax else "fakta",
+        "explanation": data.explanation,
+        "source_url": data.source_url
+    })
+
+    return {"mission_id": mission_id, "news_snippet": data.news_snippet}
 
 @app.post("/api/hoax-quiz/check")
 async def check_hoax_answer(request: HoaxCheckRequest):
     mission_id = request.mission_id
-    user_choice_str = request.user_choice.strip().lower()
+    user_choice_str = request.user_choice.lower()
 
-    if mission_id not in GAME_CACHE:
+    cached = await GAME_STORE.pop(mission_id)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Kuis tidak ditemukan atau sudah kedaluwarsa.")
 
-    cached = GAME_CACHE[mission_id]
-    correct_bool = cached["is_hoax"]
-    correct_str = "hoax" if correct_bool else "fakta"
+    correct_str = cached.get("correct_str") or ("hoax" if cached["is_hoax"] else "fakta")
     is_correct = (user_choice_str == correct_str)
-    del GAME_CACHE[mission_id]
 
     return {
         "is_correct": is_correct,
@@ -329,124 +886,228 @@ async def check_hoax_answer(request: HoaxCheckRequest):
 # ======================================================================
 # Endpoint: Library Hub (generate full text)
 # ======================================================================
-@app.post("/api/library/generate-full-text")
-async def generate_library_full_text(request: LibraryGenerateRequest):
-    game_id = str(uuid.uuid4())
-    system_prompt = (
-        "Anda adalah penulis. Buat full_text sekitar 150-200 kata sesuai format dan genre, "
-        "dan berikan array 'blanks' tepat 5 kata penting dari teks. Return JSON with keys: full_text, blanks."
-    )
-    user_prompt = f"Format: {request.format}, Genre: {request.genre}"
-
+async def _materialize_library_text(game_id: str, fmt: str, genre: str) -> None:
     try:
-        data = await call_ai_json(system_prompt=system_prompt, user_prompt=user_prompt, expect_json=True, max_tokens=800)
+        raw = await call_ai_json(system_prompt=LIBRARY_SYSTEM_PROMPT, user_prompt=f"Format: {fmt}, Genre: {genre}", expect_json=True, max_tokens=800, cache_ttl=60)
+        data = _LIBRARY_ADAPTER.validate_python(raw)
+    except ValidationError:
+        await GAME_STORE.set(game_id, {"status": "failed", "detail": "AI tidak mengembalikan teks atau kata kunci yang valid."})
+        return
     except HTTPException as e:
-        raise HTTPException(status_code=500, detail=f"Gagal membuat teks Library: {e.detail}")
+        await GAME_STORE.set(game_id, {"status": "failed", "detail": f"Gagal membuat teks Library: {e.detail}"})
+        return
+    except Exception as e:
+        # Sama seperti _materialize_mission: kegagalan transport tetap
+        # harus menghasilkan record failed, bukan pending selamanya.
+        await GAME_STORE.set(game_id, {"status": "failed", "detail": f"Gagal membuat teks Library: {e}"})
+        return
 
     # verify blanks exist
-    full_text = data.get("full_text", "")
-    blanks = data.get("blanks", [])
-    if not full_text or not isinstance(blanks, list) or len(blanks) == 0:
-        raise HTTPException(status_code=500, detail="AI tidak mengembalikan teks atau kata kunci yang valid.")
+    full_text = data.full_text
+    blanks = data.blanks
+    if not full_text or not blanks:
+        await GAME_STORE.set(game_id, {"status": "failed", "detail": "AI tidak mengembalikan teks atau kata kunci yang valid."})
+        return
 
     full_lower = full_text.lower()
+    # Tokenisasi sekali -> set: cek blank kata-tunggal jadi O(1).
+    # Substring search tinggal fallback untuk frasa multi-kata.
+    tokens = set(re.findall(r"\w+", full_lower))
     verified = []
     for b in blanks:
-        cb = str(b).strip()
-        if cb and cb.lower().rstrip(".,?!") in full_lower:
+        cb = b.strip()
+        if not cb:
+            continue
+        key = cb.lower().rstrip(".,?!")
+        if key in tokens or key in full_lower:
             verified.append(cb)
 
     if not verified:
-        raise HTTPException(status_code=500, detail="AI gagal membuat kata kunci valid untuk teks ini.")
+        await GAME_STORE.set(game_id, {"status": "failed", "detail": "AI gagal membuat kata kunci valid untuk teks ini."})
+        return
+
+    # correct_norm: dinormalisasi sekali di sini; jawaban tidak berubah
+    # antara generate dan submit, jadi validate tinggal membandingkan.
+    # Pola blank tidak ikut disimpan (objek regex tidak JSON-safe untuk
+    # Redis); _blank_out_text punya jalur cepat tanpa pattern.
+    await GAME_STORE.set(game_id, {
+        "status": "ready",
+        "full_text": full_text,
+        "title": f"{fmt} ({genre})",
+        "correct_answers": verified,
+        "correct_norm": [w.strip().casefold() for w in verified],
+    })
 
-    GAME_CACHE[game_id] = {"full_text": full_text, "correct_answers": verified}
-    return {"game_id": game_id, "full_text": full_text, "title": f"{request.format} ({request.genre})"}
+@app.post("/api/library/generate-full-text")
+async def generate_library_full_text(request: LibraryGenerateRequest, background_tasks: BackgroundTasks):
+    # Pola job + polling yang sama dengan generate-mission: 202 dulu,
+    # teks digenerate di background, klien poll /api/library/full-text/{id}.
+    game_id = token_urlsafe(16)
+    await GAME_STORE.set(game_id, {"status": "pending"})
+    background_tasks.add_task(_materialize_library_text, game_id, request.format, request.genre)
+    return ORJSONResponse(status_code=202, content={"game_id": game_id, "status": "pending"})
+
+@app.get("/api/library/full-text/{game_id}")
+async def get_library_full_text(game_id: str):
+    cached = await GAME_STORE.get(game_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Game tidak ditemukan atau sudah kedaluwarsa.")
+    status = cached.get("status", "ready")
+    if status != "ready":
+        return {"game_id": game_id, "status": status, "detail": cached.get("detail", "")}
+    return {"game_id": game_id, "status": "ready", "full_text": cached["full_text"], "title": cached.get("title", "")}
 
 @app.get("/api/library/get-quiz-text/{game_id}")
 async def get_library_quiz_text(game_id: str):
-    if game_id not in GAME_CACHE or "correct_answers" not in GAME_CACHE[game_id]:
+    cached = await GAME_STORE.get(game_id)
+    if cached is None or "correct_answers" not in cached:
         raise HTTPException(status_code=404, detail="Game tidak ditemukan atau data tidak valid.")
 
-    cached = GAME_CACHE[game_id]
-    text = cached["full_text"]
     answers = cached["correct_answers"]
-    placeholder = "[.....]"
-
-    # replace case-insensitive first occurrence per answer
-    for w in answers:
-        pattern = re.compile(re.escape(w), flags=re.IGNORECASE)
-        text, n = pattern.subn(placeholder, text, count=1)
+    text = _blank_out_text(cached["full_text"], answers)
     return {"game_id": game_id, "text_with_blanks": text, "total_questions": len(answers)}
 
 @app.post("/api/library/validate-blanks/{game_id}")
 async def validate_library_blanks(game_id: str, request: LibraryQuizSubmitRequest):
-    if game_id not in GAME_CACHE or "correct_answers" not in GAME_CACHE[game_id]:
+    cached = await GAME_STORE.pop(game_id)
+    if cached is None or "correct_answers" not in cached:
+        if cached is not None:
+            # Job masih pending / gagal: kembalikan entri, jangan dikonsumsi.
+            await GAME_STORE.set(game_id, cached)
         raise HTTPException(status_code=404, detail="Game tidak ditemukan atau jawaban tidak valid.")
-    cached = GAME_CACHE[game_id]
     correct = cached["correct_answers"]
     user_answers = request.user_answers
 
     if len(user_answers) != len(correct):
+        await GAME_STORE.set(game_id, cached)
         raise HTTPException(status_code=400, detail="Jumlah jawaban tidak sesuai.")
 
-    results = []
-    total = 0
-    per = 100 / len(correct)
-    for i in range(len(correct)):
-        ok = user_answers[i].strip().lower() == correct[i].strip().lower()
-        score = per if ok else 0
-        total += score
-        results.append({"blank_index": i+1, "user_answer": user_answers[i], "correct_answer": correct[i], "is_correct": ok})
+    # Batch compare: satu pass ter-zip menghasilkan mask boolean,
+    # results dirakit dari mask itu tanpa kerja per-item tambahan.
+    # sum(flags) adalah hitungan int; satu operasi float di akhir.
+    flags = [u.casefold() == c for u, c in zip(user_answers, cached["correct_norm"])]
+    total = round(sum(flags) * 100 / len(correct))
+    results = [
+        {"blank_index": i + 1, "user_answer": u, "correct_answer": c, "is_correct": ok}
+        for i, (u, c, ok) in enumerate(zip(user_answers, correct, flags))
+    ]
 
-    del GAME_CACHE[game_id]
-    return {"total_score": round(total), "results": results, "full_text": cached["full_text"]}
+    return {"total_score": total, "results": results, "full_text": cached["full_text"]}
 
 # ======================================================================
 # Endpoint: Grammar Zone
 # ======================================================================
 @app.post("/api/grammar-zone/generate-game")
 async def generate_grammar_game(request: GrammarGenerateRequest):
-    game_id = str(uuid.uuid4())
-    system_prompt = (
-        "Anda pembuat kuis tata bahasa. Buat tepat 5 kalimat (campuran benar/salah). "
-        "Return JSON: { sentences_to_fix: [...], correct_sentences: [...] }"
-    )
+    game_id = token_urlsafe(16)
     user_prompt = f"Genre: {request.genre}"
     try:
-        data = await call_ai_json(system_prompt=system_prompt, user_prompt=user_prompt, expect_json=True, max_tokens=600)
+        raw = await call_ai_json(system_prompt=GRAMMAR_SYSTEM_PROMPT, user_prompt=user_prompt, expect_json=True, max_tokens=600, cache_ttl=60)
     except HTTPException as e:
         raise HTTPException(status_code=500, detail=f"Gagal membuat game Tata Bahasa: {e.detail}")
 
-    GAME_CACHE[game_id] = {"correct_sentences": data["correct_sentences"], "original_sentences": data["sentences_to_fix"]}
-    return {"game_id": game_id, "genre": request.genre, "sentences_to_fix": data["sentences_to_fix"]}
+    try:
+        data = _GRAMMAR_ADAPTER.validate_python(raw)
+    except ValidationError:
+        raise HTTPException(status_code=500, detail="AI tidak mengembalikan field yang diperlukan.")
+
+    await GAME_STORE.set(game_id, {
+        "correct_sentences": data.correct_sentences,
+        "original_sentences": data.sentences_to_fix,
+        "correct_norm": [s.strip().casefold() for s in data.correct_sentences]
+    })
+    return {"game_id": game_id, "genre": request.genre, "sentences_to_fix": data.sentences_to_fix}
 
 @app.post("/api/grammar-zone/submit-game/{game_id}")
 async def submit_grammar_game(game_id: str, request: GrammarSubmitRequest):
-    if game_id not in GAME_CACHE or "correct_sentences" not in GAME_CACHE[game_id]:
+    cached = await GAME_STORE.pop(game_id)
+    if cached is None or "correct_sentences" not in cached:
+        if cached is not None:
+            await GAME_STORE.set(game_id, cached)
         raise HTTPException(status_code=404, detail="Game tidak ditemukan atau data tidak valid.")
 
-    cached = GAME_CACHE[game_id]
     correct_sentences = cached["correct_sentences"]
     original_sentences = cached["original_sentences"]
     user_corrections = request.user_corrections
 
     if len(user_corrections) != len(correct_sentences):
+        await GAME_STORE.set(game_id, cached)
         raise HTTPException(status_code=400, detail="Jumlah jawaban tidak sesuai.")
 
-    results = []
-    total = 0
-    per = 100 / len(correct_sentences)
-    for i in range(len(correct_sentences)):
-        ok = user_corrections[i].strip().lower() == correct_sentences[i].strip().lower()
-        score = per if ok else 0
-        total += score
-        results.append({"original": original_sentences[i], "user_correction": user_corrections[i], "correct_sentence": correct_sentences[i], "is_correct": ok})
+    # Batch compare, sama seperti validate-blanks.
+    flags = [u.casefold() == c for u, c in zip(user_corrections, cached["correct_norm"])]
+    total = round(sum(flags) * 100 / len(correct_sentences))
+    results = [
+        {"original": o, "user_correction": u, "correct_sentence": c, "is_correct": ok}
+        for o, u, c, ok in zip(original_sentences, user_corrections, correct_sentences, flags)
+    ]
 
-    del GAME_CACHE[game_id]
-    return {"total_score": round(total), "results": results}
+    return {"total_score": total, "results": results}
+
+# ======================================================================
+# Endpoint: batch gateway
+#
+# Flow klien yang umum (generate lalu get-quiz-text, dsb.) memakan satu
+# round-trip WAN per langkah. /api/batch menerima beberapa sub-request
+# sekaligus, mengeksekusinya paralel lewat klien ASGI internal, dan
+# mengembalikan semua hasil dalam satu respons.
+# ======================================================================
+@app.post("/api/batch")
+async def batch_gateway(request: BatchRequest):
+    client = _get_self_http()
+
+    async def run_one(sub: BatchSubRequest) -> Dict[str, Any]:
+        # Hanya endpoint /api/ yang boleh dipanggil; /api/batch sendiri
+        # ditolak supaya tidak bisa rekursif. Cek dilakukan pada path
+        # yang sudah di-unquote + dinormalisasi — "/api/../api/batch"
+        # mentah lolos startswith tapi tetap mendarat di /api/batch —
+        # dan hasil normalisasi itu pula yang di-dispatch.
+        path = posixpath.normpath(unquote(sub.path))
+        if not path.startswith("/api/") or path.startswith("/api/batch"):
+            return {"id": sub.id, "status": 400, "body": {"detail": "Path tidak diizinkan."}}
+        method = sub.method.upper()
+        # Exception tak tertangani dari satu sub-request (ASGITransport
+        # melempar ulang exception app) tidak boleh menggagalkan seluruh
+        # batch — petakan jadi hasil 500 per-id.
+        try:
+            if method == "GET":
+                resp = await client.get(path)
+            elif method == "POST":
+                resp = await client.post(
+                    path,
+                    content=orjson.dumps(sub.body or {}),
+                    headers={"content-type": "application/json"},
+                )
+            else:
+                return {"id": sub.id, "status": 405, "body": {"detail": "Metode tidak didukung."}}
+        except Exception as e:
+            return {"id": sub.id, "status": 500, "body": {"detail": f"Sub-request gagal: {e}"}}
+        try:
+            body = orjson.loads(resp.content)
+        except orjson.JSONDecodeError:
+            body = resp.text
+        return {"id": sub.id, "status": resp.status_code, "body": body}
+
+    responses = await asyncio.gather(*[run_one(sub) for sub in request.requests])
+    return {"responses": responses}
 
 # ======================================================================
 # Run (for local dev)
 # ======================================================================
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)
+    if os.getenv("DEV_RELOAD", "").lower() in ("1", "true"):
+        # Mode dev: auto-reload, satu worker, loop default
+        uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)
+    else:
+        # uvloop + httptools: event loop & HTTP parser lebih cepat dari
+        # default asyncio. Worker mengikuti jumlah core (override via
+        # WEB_CONCURRENCY); untuk workers > 1 set REDIS_URL supaya state
+        # game dibagi antar worker (lihat GameStore).
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8001,
+            workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+            loop="uvloop",
+            http="httptools",
+        )